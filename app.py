@@ -1,11 +1,24 @@
 import asyncio
-import json
-import pandas as pd
+import csv
+import hashlib
+import io
+import orjson
 import os
+import random
+import re
+import sqlite3
+import threading
 import time
+import uuid
+import xlsxwriter
+from collections import deque
 from datetime import datetime
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
 from playwright.async_api import async_playwright
-from flask import Flask, send_file, jsonify, render_template_string
+from flask import Flask, request, send_file, jsonify
+from flask_compress import Compress
+from jinja2 import Template
 import logging
 
 # Configure logging
@@ -24,94 +37,741 @@ CITIES = [
     "sangli", "nagaur"
 ]
 
-class VenueScraper:
-    def __init__(self):
-        self.venues_data = []
-        self.failed_cities = []
-        self.scraped_cities = []
+# Listing page per city, built once; /test_city may still pass other slugs
+CITY_URL_TEMPLATE = "https://www.khelomore.com/sports-venues/{}/sports/all"
+CITY_URLS = {city: CITY_URL_TEMPLATE.format(city) for city in CITIES}
+
+# Whitespace cleanup for multi-line fields read via textContent, compiled once
+_SPACE_RE = re.compile(r'[ \t\r\f\v]+')
+_BLANK_LINE_RE = re.compile(r'\s*\n\s*')
+
+# Scraped venues, one JSON object per line, appended as each city finishes
+VENUES_FILE = 'venues_data.ndjson'
+
+# Excel export, built from VENUES_FILE when downloaded
+EXCEL_FILE = 'venues_data.xlsx'
+PROGRESS_FILE = 'progress.json'
+# NDJSON size above which /download_excel refuses and points to /download_csv
+MAX_EXCEL_SOURCE_BYTES = int(os.environ.get("MAX_EXCEL_SOURCE_BYTES", 100 * 1024 * 1024))
+# /test_city scrapes (one browser each) allowed at once, and how long an
+# uncollected result is kept
+MAX_TEST_JOBS = int(os.environ.get("MAX_TEST_JOBS", 2))
+TEST_JOB_TTL = int(os.environ.get("TEST_JOB_TTL", 600))
+
+# Minimum seconds between progress.json rewrites
+PROGRESS_FLUSH_INTERVAL = float(os.environ.get("PROGRESS_FLUSH_INTERVAL", 1))
+
+# Venue details cache, reused for CACHE_TTL seconds before being scraped again
+CACHE_FILE = 'venues_cache.db'
+# Cookies and local storage saved from a run so the next one starts warm
+STATE_FILE = 'khelomore_state.json'
+CACHE_TTL = int(os.environ.get("CACHE_TTL", 7 * 24 * 3600))
+# Listings change more often than venue details, so they expire sooner
+LISTING_CACHE_TTL = int(os.environ.get("LISTING_CACHE_TTL", 24 * 3600))
+
+# Block-level fields whose line breaks are kept when cleaning text
+MULTILINE_FIELDS = {
+    'about_venue', 'available_sports', 'highlights', 'amenities',
+    'offer', 'facilities', 'venue_rules'
+}
+
+# Number of cities scraped concurrently on the shared browser
+MAX_CITY_CONCURRENCY = int(os.environ.get("MAX_CITY_CONCURRENCY", 4))
+
+# Number of pages extracting venue details concurrently per city
+VENUE_CONCURRENCY = int(os.environ.get("VENUE_CONCURRENCY", 3))
+
+# Navigations in flight across all cities, and requests per second per host
+MAX_INFLIGHT = int(os.environ.get("MAX_INFLIGHT", 8))
+RATE_LIMIT_RPS = float(os.environ.get("RATE_LIMIT_RPS", 5))
+
+# Cities a pooled browser context serves before it is replaced
+CONTEXT_MAX_USES = int(os.environ.get("CONTEXT_MAX_USES", 10))
+
+# Default Playwright timeouts (ms) and the budget for one venue, navigation,
+# extraction and retries included (s)
+ACTION_TIMEOUT = 5000
+NAVIGATION_TIMEOUT = 15000
+VENUE_TIMEOUT = 30
+
+# Resource types the scraper never reads. Stylesheets are kept because the
+# visibility checks depend on computed styles
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+
+# Third-party analytics and ad hosts aborted on every page
+BLOCKED_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "facebook.net",
+    "connect.facebook.com",
+    "hotjar.com",
+    "segment.com",
+    "segment.io"
+)
+
+# Selectors tried in order to locate venue cards on a listing page
+VENUE_SELECTORS = [
+    "div[data-testid*='venue']",  # Common pattern for venues
+    "div[class*='venue-card']",
+    "div[class*='venue-item']",
+    "div[class*='card']",
+    "[data-venue-id]",
+    # Fallback to the original positional path, as valid CSS
+    "#root div div div div div:nth-of-type(2) div:nth-of-type(2) div:nth-of-type(2) > div",
+    # Alternative structure selectors
+    "div[role='button']",
+    "a[href*='/venue/']",
+    "div[onclick*='venue']"
+]
+
+# Counts venue cards using the first selector that matches anything
+VENUE_COUNT_JS = """
+(selectors) => {
+    for (const selector of selectors) {
+        try {
+            const count = document.querySelectorAll(selector).length;
+            if (count > 0) {
+                return count;
+            }
+        } catch (e) {
+            continue;  // Not valid CSS for querySelectorAll
+        }
+    }
+    return 0;
+}
+"""
+
+# Resource types that carry the venue list data behind load more/scroll
+DATA_RESOURCE_TYPES = ("xhr", "fetch")
+# The listing's data requests go to this domain or its subdomains; anything
+# else (analytics that are not blocked, widgets) is not venue data
+SITE_DOMAIN = "khelomore.com"
+
+# Resolves true once the venue count exceeds `count`, or false after `timeout`
+# ms. Recounts only after DOM mutations (batched per 50ms) instead of polling
+VENUES_GREW_JS = """
+({selectors, count, timeout}) => new Promise((resolve) => {
+    const countVenues = """ + VENUE_COUNT_JS.strip() + """;
+    if (countVenues(selectors) > count) {
+        resolve(true);
+        return;
+    }
+    let scheduled = null;
+    const finish = (grew) => {
+        observer.disconnect();
+        clearTimeout(scheduled);
+        clearTimeout(deadline);
+        resolve(grew);
+    };
+    const observer = new MutationObserver(() => {
+        if (scheduled === null) {
+            scheduled = setTimeout(() => {
+                scheduled = null;
+                if (countVenues(selectors) > count) {
+                    finish(true);
+                }
+            }, 50);
+        }
+    });
+    const deadline = setTimeout(() => finish(false), timeout);
+    observer.observe(document.body || document.documentElement, {childList: true, subtree: true});
+})
+"""
+
+# Venue detail fields and their selectors, tried in order with CSS ahead of
+# the xpath fallbacks that CSS cannot express (text matches)
+FIELD_SELECTORS = {
+    'name': [
+        "h1",
+        "h2",
+        "[data-testid*='venue-name']",
+        "[class*='venue-name']",
+        "[class*='title']",
+        "[class*='name']"
+    ],
+    'price': [
+        "[class*='price']",
+        "[data-testid*='price']",
+        "xpath=//*[contains(text(), '₹')]"
+    ],
+    'timing': [
+        "[class*='timing']",
+        "[class*='hours']",
+        "[data-testid*='timing']",
+        "xpath=//*[contains(text(), 'AM') or contains(text(), 'PM')]"
+    ],
+    'address': [
+        "[class*='address']",
+        "[class*='location']",
+        "[data-testid*='address']"
+    ],
+    'rating': [
+        "[class*='rating']",
+        "[data-testid*='rating']",
+        "[class*='rating'] span:first-of-type",
+        "xpath=//*[contains(text(), '★') or contains(text(), '⭐')]"
+    ],
+    'raters': [
+        "[class*='raters']",
+        "[class*='reviews']",
+        "[class*='rating'] span:nth-of-type(2)",
+        "xpath=//*[contains(text(), 'review') or contains(text(), 'rating')]"
+    ],
+    
+    # Additional information using more flexible selectors
+    'about_venue': ["[class*='about']", "[class*='description']"],
+    'available_sports': ["[class*='sports']", "[class*='activities']"],
+    'highlights': ["[class*='highlight']", "[class*='features']"],
+    'amenities': ["[class*='amenities']", "[class*='facilities']"],
+    'offer': ["[class*='offer']", "[class*='deal']"]
+}
+
+# schema.org types whose JSON-LD record describes the venue itself
+JSON_LD_VENUE_TYPES = [
+    'SportsActivityLocation', 'SportsClub', 'StadiumOrArena', 'ExerciseGym',
+    'LocalBusiness', 'Place'
+]
+
+# Placeholder for fields that could not be found, shared with the page script
+NA = 'N/A'
+
+# Fields read by opening a modal on the venue page
+MODAL_FIELDS = ['facilities', 'venue_rules']
+
+# Column order of the Excel and CSV exports
+EXPORT_COLUMNS = [*FIELD_SELECTORS, *MODAL_FIELDS, 'url', 'city', 'scraped_at']
+
+# Argument for EXTRACT_VENUE_JS, built once
+EXTRACT_VENUE_ARGS = {
+    'fields': FIELD_SELECTORS,
+    'modals': MODAL_FIELDS,
+    'multiline': list(MULTILINE_FIELDS),
+    'missing': NA,
+    'venueTypes': JSON_LD_VENUE_TYPES
+}
+
+# Visibility check and CSS/xpath lookup shared by the in-page scripts below.
+# Installed once per document as a context init script, which also lets the
+# xpath fallbacks be compiled once per page instead of on every lookup
+SCRAPER_INIT_JS = """
+(() => {
+    const xpaths = new Map();
+    // Same rule as Playwright's is_visible(): a non-empty box, not visibility:hidden
+    const isVisible = (el) => {
+        if (el.nodeType !== 1) {
+            return false;
+        }
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0 && getComputedStyle(el).visibility !== 'hidden';
+    };
+    const findAll = (selector) => {
+        if (!selector.startsWith('xpath=')) {
+            return Array.from(document.querySelectorAll(selector));
+        }
+        if (!xpaths.has(selector)) {
+            xpaths.set(selector, document.createExpression(selector.slice(6), null));
+        }
+        const snapshot = xpaths.get(selector).evaluate(document,
+            XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        const nodes = [];
+        for (let i = 0; i < snapshot.snapshotLength; i++) {
+            nodes.push(snapshot.snapshotItem(i));
+        }
+        return nodes;
+    };
+    Object.defineProperty(window, '__scraper', {value: {isVisible, findAll}});
+})();
+"""
+
+# Prologue for the in-page scripts, picking up the helpers installed above
+DOM_HELPERS_JS = """
+    const {isVisible, findAll} = window.__scraper;
+"""
+
+# Load more button candidates in priority order, as plain CSS or xpath so the
+# whole list can be checked inside the page
+LOAD_MORE_SELECTORS = [
+    # Text-based selectors
+    "xpath=//*[translate(normalize-space(text()), 'ADEHILMORSVW', 'adehilmorsvw')"
+    " = 'load more' or translate(normalize-space(text()), 'ADEHILMORSVW', 'adehilmorsvw')"
+    " = 'show more' or translate(normalize-space(text()), 'ADEHILMORSVW', 'adehilmorsvw')"
+    " = 'view more']",
+    
+    # Button selectors
+    "xpath=//button[contains(., 'Load') or contains(., 'More')]",
+    "xpath=//div[contains(., 'Load More') and not(.//div[contains(., 'Load More')])]",
+    "xpath=//span[contains(., 'Load More')]",
+    
+    # Class-based selectors
+    "[class*='load-more']",
+    "[class*='loadmore']",
+    "[class*='load_more']",
+    "[class*='show-more']",
+    "[class*='view-more']",
+    
+    # Generic button selectors
+    "button[class*='load']",
+    "div[class*='load']",
+    "button[class*='more']",
+    "div[class*='more']",
+    
+    # XPath alternatives
+    "xpath=//button[contains(text(), 'Load') or contains(text(), 'More')]",
+    "xpath=//div[contains(text(), 'Load More') or contains(text(), 'Show More')]",
+    "xpath=//span[contains(text(), 'Load More')]",
+    "xpath=//*[contains(@class, 'load') and contains(@class, 'more')]",
+    "xpath=//*[contains(@onclick, 'load') or contains(@onclick, 'more')]"
+]
+
+# Finds the first visible load more candidate, tags it with data-load-more
+# so it can be clicked, and returns its selector index (-1 when none)
+LOAD_MORE_JS = """
+(selectors) => {""" + DOM_HELPERS_JS + """
+    document.querySelectorAll('[data-load-more]').forEach((el) => el.removeAttribute('data-load-more'));
+    for (let i = 0; i < selectors.length; i++) {
+        let nodes;
+        try {
+            nodes = findAll(selectors[i]);
+        } catch (e) {
+            continue;
+        }
+        const match = nodes.find(isVisible);
+        if (match) {
+            match.setAttribute('data-load-more', '');
+            return i;
+        }
+    }
+    return -1;
+}
+"""
+
+# Collects the detail link of every venue card in a single round trip
+VENUE_URLS_JS = """
+(selectors) => {
+    for (const selector of selectors) {
+        let elements;
+        try {
+            elements = document.querySelectorAll(selector);
+        } catch (e) {
+            continue;  // Not valid CSS for querySelectorAll
+        }
+        const urls = [];
+        for (const el of elements) {
+            const link = el.closest('a[href]') || el.querySelector('a[href]');
+            if (link && !urls.includes(link.href)) {
+                urls.push(link.href);
+            }
+        }
+        if (urls.length > 0) {
+            return urls;
+        }
+    }
+    return [];
+}
+"""
+
+# Reads every venue field in the browser: the first visible non-empty match
+# per field wins, then each modal is opened, read and closed in turn
+EXTRACT_VENUE_JS = """
+async ({fields, modals, multiline, missing, venueTypes}) => {""" + DOM_HELPERS_JS + """
+    const firstVisibleText = (selectors) => {
+        for (const selector of selectors) {
+            let nodes;
+            try {
+                nodes = findAll(selector);
+            } catch (e) {
+                continue;
+            }
+            for (const node of nodes) {
+                const text = isVisible(node) ? (node.textContent || '').trim() : '';
+                if (text) {
+                    return text;
+                }
+            }
+        }
+        return missing;
+    };
+    const waitFor = async (find, timeout) => {
+        const deadline = Date.now() + timeout;
+        let found = find();
+        while (!found && Date.now() < deadline) {
+            await new Promise((resolve) => setTimeout(resolve, 50));
+            found = find();
+        }
+        return found;
+    };
+
+    // Venue record from schema.org JSON-LD, when the page embeds one
+    const structuredData = () => {
+        const nodes = [];
+        for (const script of document.querySelectorAll("script[type='application/ld+json']")) {
+            try {
+                const data = JSON.parse(script.textContent);
+                nodes.push(...[].concat(data['@graph'] || data));
+            } catch (e) {
+                continue;
+            }
+        }
+        // Only venue types; site-wide Organization/WebSite blocks also carry
+        // a name and address, but they describe KheloMore itself
+        const venue = nodes.find((node) => node && node.name &&
+            [].concat(node['@type'] || []).some((type) => venueTypes.includes(type)));
+        if (!venue) {
+            return {};
+        }
+        const address = venue.address || '';
+        const rating = venue.aggregateRating || {};
+        const hours = venue.openingHours || '';
+        return {
+            name: venue.name,
+            address: typeof address === 'string' ? address : [address.streetAddress,
+                address.addressLocality, address.addressRegion, address.postalCode]
+                .filter(Boolean).join(', '),
+            rating: rating.ratingValue,
+            raters: rating.ratingCount || rating.reviewCount,
+            timing: [].concat(hours).join(', '),
+            about_venue: venue.description
+        };
+    };
+
+    const structured = structuredData();
+    const info = {};
+    for (const [key, selectors] of Object.entries(fields)) {
+        // Only sweep the selectors for fields the JSON-LD did not provide
+        const value = structured[key] ? String(structured[key]).trim() : '';
+        const text = value || firstVisibleText(selectors);
+        // Single-line fields are collapsed here; block fields are cleaned in Python
+        info[key] = multiline.includes(key) ? text : text.replace(/\s+/g, ' ');
+    }
+
+    for (const modal of modals) {
+        info[modal] = missing;
+        const label = modal.replace('_', ' ').toLowerCase();
+        const buttons = document.querySelectorAll(
+            "button, div[role='button'], [class*='modal'], [class*='popup']");
+        const button = Array.from(buttons).find((b) =>
+            isVisible(b) && (b.textContent || '').toLowerCase().includes(label));
+        if (!button) {
+            continue;
+        }
+
+        button.click();
+        const content = await waitFor(() => Array.from(document.querySelectorAll(
+            "[role='dialog'], [class*='modal'], [class*='popup']")).find(isVisible), 2000);
+        if (content) {
+            const text = (content.textContent || '').trim();
+            if (text) {
+                info[modal] = text;
+            }
+            const close = Array.from(document.querySelectorAll(
+                "[aria-label*='close'], [class*='close'], button")).find((b) =>
+                isVisible(b) && (b.matches("[aria-label*='close'], [class*='close']") ||
+                    (b.textContent || '').trim() === '×'));
+            if (close) {
+                close.click();
+            }
+        }
+    }
+    return info;
+}
+"""
+
+async def backoff(attempt, base=0.5, cap=30.0):
+    """Sleep for an exponentially growing, jittered delay before a retry"""
+    await asyncio.sleep(min(cap, base * 2 ** attempt + random.uniform(0, base)))
+
+class ContextPool:
+    """Pool of reusable browser contexts on one shared browser"""
+    
+    def __init__(self, create_context, size, max_uses=CONTEXT_MAX_USES):
+        self.create_context = create_context
+        self.max_uses = max_uses
+        self._idle = asyncio.Queue()
+        self._slots = asyncio.BoundedSemaphore(size)
+        self._contexts = []
+        self._uses = {}
+    
+    async def acquire(self):
+        """Take an idle context, creating one while the pool is below size"""
+        await self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
         
-    async def wait_for_element_with_retry(self, page, selector, timeout=30000, max_retries=3):
-        """Wait for element with retry logic"""
-        for attempt in range(max_retries):
+        try:
+            context = await self.create_context()
+        except Exception:
+            self._slots.release()
+            raise
+        self._contexts.append(context)
+        self._uses[context] = 0
+        return context
+    
+    async def release(self, context):
+        """Close the context's pages and hand it back to the pool"""
+        self._uses[context] += 1
+        if self._uses[context] >= self.max_uses:
+            # Retire long-lived contexts so their memory and cache don't grow
+            # for the whole run; acquire() creates a fresh one in this slot
+            await self._retire(context)
+            self._slots.release()
+            return
+        
+        for page in list(context.pages):
             try:
-                if selector.startswith("xpath="):
-                    element = await page.wait_for_selector(selector, timeout=timeout)
-                else:
-                    element = await page.wait_for_selector(selector, timeout=timeout)
-                    
-                if element and await element.is_visible():
-                    return element
+                await page.close()
             except Exception as e:
-                logger.warning(f"Attempt {attempt + 1} failed for selector {selector}: {str(e)}")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(2)
-        return None
+                logger.debug(f"Failed to close pooled page: {str(e)}")
+        self._idle.put_nowait(context)
+        self._slots.release()
+    
+    async def _retire(self, context):
+        """Close a context and forget it"""
+        self._contexts.remove(context)
+        del self._uses[context]
+        try:
+            await context.close()
+        except Exception as e:
+            logger.debug(f"Failed to close pooled context: {str(e)}")
     
+    async def close(self):
+        """Close every context the pool created"""
+        for context in self._contexts:
+            try:
+                await context.close()
+            except Exception as e:
+                logger.debug(f"Failed to close pooled context: {str(e)}")
+        self._contexts = []
+        self._uses = {}
+
+class AIMDController:
+    """Adaptive limit on concurrent venue page loads (AIMD)
+
+    The limit grows additively while recent loads stay under the target
+    latency and is halved on every failed or rate-limited load.
+    """
+    
+    def __init__(self, initial=2, minimum=1, maximum=8, target_latency=5.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self._latencies = deque(maxlen=10)
+        self._in_flight = 0
+        self._condition = asyncio.Condition()
+    
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < int(self.limit))
+            self._in_flight += 1
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+    
+    def on_success(self, latency):
+        """Record a successful load and raise the limit while loads are fast"""
+        self._latencies.append(latency)
+        average = sum(self._latencies) / len(self._latencies)
+        if average <= self.target_latency:
+            self.limit = min(self.maximum, self.limit + 0.5)
+    
+    def on_error(self):
+        """Halve the limit after a failed or rate-limited load"""
+        self.limit = max(self.minimum, self.limit * 0.5)
+        logger.warning(f"Backing off, venue load concurrency now {int(self.limit)}")
+
+class TokenBucket:
+    """Token bucket limiting the request rate to a single host"""
+    
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Wait until a request may be sent"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+    
+    def pause(self, seconds):
+        """Hold all requests for `seconds`, e.g. from a Retry-After header"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+    
+    async def __aenter__(self):
+        await self.acquire()
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+class VenueCache:
+    """SQLite cache of scraped venue details and per-city venue listings"""
+    
+    def __init__(self, path=CACHE_FILE, ttl=CACHE_TTL, listing_ttl=LISTING_CACHE_TTL):
+        self.ttl = ttl
+        self.listing_ttl = listing_ttl
+        # Shared by to_thread workers; the lock keeps a single writer at a time
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS venues_cache ("
+                "url TEXT PRIMARY KEY, data BLOB, fetched_at INTEGER)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS listings_cache ("
+                "city TEXT PRIMARY KEY, urls BLOB, fetched_at INTEGER)"
+            )
+            self._conn.commit()
+    
+    def get_many(self, urls):
+        """Return {url: venue_info} for the URLs with a fresh cache entry"""
+        if not urls:
+            return {}
+        placeholders = ", ".join("?" * len(urls))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT url, data FROM venues_cache WHERE url IN ({placeholders}) AND fetched_at > ?",
+                (*urls, int(time.time()) - self.ttl)
+            ).fetchall()
+        return {url: orjson.loads(data) for url, data in rows}
+    
+    def put(self, url, venue_info):
+        """Store freshly scraped venue details"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO venues_cache (url, data, fetched_at) VALUES (?, ?, ?)",
+                (url, orjson.dumps(venue_info), int(time.time()))
+            )
+            self._conn.commit()
+    
+    def get_listing(self, city):
+        """Return the city's cached venue URLs, or None if missing or stale"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT urls FROM listings_cache WHERE city = ? AND fetched_at > ?",
+                (city, int(time.time()) - self.listing_ttl)
+            ).fetchone()
+        return orjson.loads(row[0]) if row else None
+    
+    def put_listing(self, city, urls):
+        """Store the venue URLs harvested from a city's listing"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO listings_cache (city, urls, fetched_at) VALUES (?, ?, ?)",
+                (city, orjson.dumps(urls), int(time.time()))
+            )
+            self._conn.commit()
+
+class VenueScraper:
+    def __init__(self, cache=None):
+        # Venues go straight to VENUES_FILE; only their count stays in memory
+        self.total_venues = 0
+        self.failed_cities = []
+        self.scraped_cities = []
+        self.last_updated = 'Never'
+        self.cache = cache or VenueCache()
+        
     async def safe_click(self, element, page):
         """Safely click an element with error handling"""
+        # click() scrolls and waits for actionability itself; callers wait
+        # on the venue count rather than a fixed delay afterwards
+        try:
+            await element.click(timeout=3000)
+            return True
+        except Exception as e:
+            logger.debug(f"Click not actionable, dispatching in page: {str(e)}")
+        
+        # Overlays or animations can block a real click; a DOM click still fires
         try:
-            await element.scroll_into_view_if_needed()
-            await asyncio.sleep(1)
-            await element.click()
-            await asyncio.sleep(2)  # Wait for action to complete
+            await element.evaluate("(el) => el.click()")
             return True
         except Exception as e:
             logger.error(f"Failed to click element: {str(e)}")
             return False
     
-    async def get_venue_elements(self, page):
-        """Get all venue elements using multiple selectors"""
-        venue_selectors = [
-            "div[data-testid*='venue']",  # Common pattern for venues
-            "div[class*='venue-card']",
-            "div[class*='venue-item']",
-            "div[class*='card']",
-            "[data-venue-id]",
-            # Fallback to the original selector but more flexible
-            "#root div div div div div[2] div[2] div[2] > div",
-            # Alternative structure selectors
-            "div[role='button']",
-            "a[href*='/venue/']",
-            "div[onclick*='venue']"
-        ]
-        
-        for selector in venue_selectors:
-            try:
-                elements = await page.query_selector_all(selector)
-                if elements and len(elements) > 0:
-                    logger.info(f"Found {len(elements)} venues using selector: {selector}")
-                    return elements
-            except Exception as e:
-                logger.debug(f"Selector {selector} failed: {str(e)}")
-                continue
-        
-        # If no specific selectors work, try a more generic approach
+    async def get_venue_urls(self, page):
+        """Get detail page URLs for all loaded venues"""
         try:
-            # Look for clickable divs that might be venues
-            all_divs = await page.query_selector_all("div")
-            venue_divs = []
-            
-            for div in all_divs:
-                try:
-                    # Check if div might be a venue by looking for common patterns
-                    text_content = await div.text_content()
-                    if text_content and any(keyword in text_content.lower() for keyword in 
-                                          ['₹', 'rating', 'open', 'closed', 'sports', 'court', 'field']):
-                        venue_divs.append(div)
-                except:
-                    continue
-            
-            if venue_divs:
-                logger.info(f"Found {len(venue_divs)} potential venues using generic approach")
-                return venue_divs[:50]  # Limit to first 50 to avoid false positives
-                
+            urls = await page.evaluate(VENUE_URLS_JS, VENUE_SELECTORS)
+            logger.info(f"Harvested {len(urls)} venue URLs")
+            return urls
         except Exception as e:
-            logger.error(f"Generic venue detection failed: {str(e)}")
+            logger.error(f"Failed to harvest venue URLs: {str(e)}")
+            return []
+    
+    async def count_venues(self, page):
+        """Count loaded venues inside the page"""
+        return await page.evaluate(VENUE_COUNT_JS, VENUE_SELECTORS)
+    
+    async def wait_for_venue_count(self, page, count, timeout=10000):
+        """Wait until more than `count` venue cards are on the page"""
+        try:
+            grew = await page.evaluate(
+                VENUES_GREW_JS,
+                {'selectors': VENUE_SELECTORS, 'count': count, 'timeout': timeout}
+            )
+        except Exception as e:
+            logger.debug(f"Waiting for venues failed: {str(e)}")
+            return False
+        if not grew:
+            logger.debug(f"Venue count did not grow past {count}")
+        return grew
+    
+    async def click_and_wait_for_venues(self, page, element, count):
+        """Click load more, then wait for more than `count` venue cards; False if the click failed"""
+        # Only site data requests sent after the click are a signal, not analytics
+        # or a response still in flight from the previous round
+        sent = set()
+        track = sent.add
+        page.on("request", track)
+        response_task = asyncio.ensure_future(page.wait_for_event(
+            "response",
+            predicate=lambda response: (
+                response.request in sent
+                and response.request.resource_type in DATA_RESOURCE_TYPES
+                and (urlparse(response.url).hostname or '').endswith(SITE_DOMAIN)
+            ),
+            timeout=20000
+        ))
+        count_task = asyncio.ensure_future(self.wait_for_venue_count(page, count, timeout=20000))
         
-        return []
+        try:
+            if not await self.safe_click(element, page):
+                return False
+            
+            # New cards end the wait at once; if the data arrives first, only
+            # rendering remains, so stop waiting on cards shortly after
+            done, _ = await asyncio.wait({response_task, count_task}, return_when=asyncio.FIRST_COMPLETED)
+            if count_task not in done and response_task.exception() is None:
+                await asyncio.wait({count_task}, timeout=5)
+            return True
+        finally:
+            page.remove_listener("request", track)
+            response_task.cancel()
+            count_task.cancel()
+            await asyncio.gather(response_task, count_task, return_exceptions=True)
     
     async def load_all_venues(self, page):
-        """Load all venues by clicking load more buttons"""
+        """Load all venues by clicking load more buttons and return their URLs"""
         logger.info("Starting to load all venues...")
         
         max_attempts = 30
@@ -119,15 +779,14 @@ class VenueScraper:
         consecutive_failures = 0
         last_venue_count = 0
         
+        # Wait once for the first venue cards to render; later rounds wait on
+        # the count growing after each scroll or click
+        await self.wait_for_venue_count(page, 0, timeout=15000)
+        
         while attempts < max_attempts and consecutive_failures < 3:
             try:
-                # Wait for page to stabilize
-                await page.wait_for_load_state("networkidle", timeout=15000)
-                await asyncio.sleep(3)
-                
-                # Get current venues using flexible selectors
-                current_venues = await self.get_venue_elements(page)
-                current_count = len(current_venues)
+                # Count current venues without shipping element handles
+                current_count = await self.count_venues(page)
                 
                 logger.info(f"Currently loaded venues: {current_count}")
                 
@@ -139,74 +798,29 @@ class VenueScraper:
                     consecutive_failures = 0
                     last_venue_count = current_count
                 
-                # Scroll to bottom to trigger lazy loading
+                # Scroll to bottom to trigger lazy loading; cards arriving later
+                # than this short wait are counted on the next round
                 await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                await asyncio.sleep(3)
+                await self.wait_for_venue_count(page, current_count, timeout=1500)
                 
                 # Try to find and click load more button
                 load_more_clicked = False
                 
-                # Enhanced load more button detection
-                load_more_patterns = [
-                    # Text-based selectors
-                    "text='Load More'",
-                    "text='load more'",
-                    "text='Load more'",
-                    "text='LOAD MORE'",
-                    "text='Show More'",
-                    "text='View More'",
-                    
-                    # Button selectors
-                    "button:has-text('Load')",
-                    "button:has-text('More')",
-                    "div:has-text('Load More')",
-                    "span:has-text('Load More')",
-                    
-                    # Class-based selectors
-                    "[class*='load-more']",
-                    "[class*='loadmore']",
-                    "[class*='load_more']",
-                    "[class*='show-more']",
-                    "[class*='view-more']",
-                    
-                    # Generic button selectors
-                    "button[class*='load']",
-                    "div[class*='load']",
-                    "button[class*='more']",
-                    "div[class*='more']",
-                    
-                    # XPath alternatives
-                    "xpath=//button[contains(text(), 'Load') or contains(text(), 'More')]",
-                    "xpath=//div[contains(text(), 'Load More') or contains(text(), 'Show More')]",
-                    "xpath=//span[contains(text(), 'Load More')]",
-                    "xpath=//*[contains(@class, 'load') and contains(@class, 'more')]",
-                    "xpath=//*[contains(@onclick, 'load') or contains(@onclick, 'more')]"
-                ]
-                
-                for pattern in load_more_patterns:
-                    try:
-                        elements = await page.query_selector_all(pattern)
-                        for element in elements:
-                            if await element.is_visible():
-                                success = await self.safe_click(element, page)
-                                if success:
-                                    logger.info(f"Clicked load more using pattern: {pattern}")
-                                    load_more_clicked = True
-                                    break
-                        if load_more_clicked:
-                            break
-                    except Exception as e:
-                        logger.debug(f"Pattern {pattern} failed: {str(e)}")
-                        continue
+                # Check every candidate in a single round trip, then click it
+                try:
+                    index = await page.evaluate(LOAD_MORE_JS, LOAD_MORE_SELECTORS)
+                    if index >= 0:
+                        element = await page.query_selector("[data-load-more]")
+                        if element:
+                            load_more_clicked = await self.click_and_wait_for_venues(page, element, current_count)
+                            if load_more_clicked:
+                                logger.info(f"Clicked load more using pattern: {LOAD_MORE_SELECTORS[index]}")
+                except Exception as e:
+                    logger.debug(f"Load more detection failed: {str(e)}")
                 
                 if load_more_clicked:
-                    # Wait for new content to load
-                    await page.wait_for_load_state("networkidle", timeout=20000)
-                    await asyncio.sleep(5)
-                    
                     # Verify new content loaded
-                    new_venues = await self.get_venue_elements(page)
-                    new_count = len(new_venues)
+                    new_count = await self.count_venues(page)
                     
                     if new_count > current_count:
                         logger.info(f"Successfully loaded {new_count - current_count} new venues")
@@ -224,172 +838,40 @@ class VenueScraper:
                 logger.error(f"Error in loading loop: {str(e)}")
                 consecutive_failures += 1
                 attempts += 1
-                await asyncio.sleep(5)
+                await backoff(consecutive_failures)
         
         # Get final count
-        final_venues = await self.get_venue_elements(page)
-        final_count = len(final_venues)
+        final_count = await self.count_venues(page)
         logger.info(f"Final venue count: {final_count}")
-        return final_count
+        if final_count == 0:
+            return []
+        
+        # Harvest detail URLs once instead of clicking through the listing
+        return await self.get_venue_urls(page)
     
-    async def extract_text_content(self, element):
-        """Extract text content with better formatting"""
-        try:
-            text_content = await element.text_content()
-            if not text_content:
-                return "N/A"
-            return text_content.strip()
-        except Exception as e:
-            logger.warning(f"Error extracting text content: {str(e)}")
-            return "N/A"
+    def clean_text(self, text):
+        """Collapse indentation and blank lines left over from the markup"""
+        # Short single-line values have nothing for the regexes to do
+        if '\n' not in text and '  ' not in text and '\t' not in text:
+            return text.strip()
+        text = _SPACE_RE.sub(' ', text)
+        text = _BLANK_LINE_RE.sub('\n', text)
+        return text.strip()
 
     async def extract_venue_data(self, page):
         """Extract venue data from current page with improved selectors"""
-        venue_info = {}
-        
-        # Wait for page to load completely
-        await page.wait_for_load_state("domcontentloaded", timeout=30000)
-        await asyncio.sleep(3)
-        
-        # Define selectors with fallbacks
-        selectors = {
-            'name': [
-                "h1",
-                "h2",
-                "[data-testid*='venue-name']",
-                "[class*='venue-name']",
-                "[class*='title']",
-                "xpath=//h1 | //h2 | //*[contains(@class, 'name')]"
-            ],
-            'price': [
-                "[class*='price']",
-                "[data-testid*='price']",
-                "xpath=//*[contains(text(), '₹')]",
-                "xpath=//*[contains(@class, 'price')]"
-            ],
-            'timing': [
-                "[class*='timing']",
-                "[class*='hours']",
-                "[data-testid*='timing']",
-                "xpath=//*[contains(text(), 'AM') or contains(text(), 'PM')]",
-                "xpath=//*[contains(@class, 'timing') or contains(@class, 'hours')]"
-            ],
-            'address': [
-                "[class*='address']",
-                "[class*='location']",
-                "[data-testid*='address']",
-                "xpath=//*[contains(@class, 'address') or contains(@class, 'location')]"
-            ],
-            'rating': [
-                "[class*='rating']",
-                "[data-testid*='rating']",
-                "xpath=//*[contains(@class, 'rating')]//span[1]",
-                "xpath=//*[contains(text(), '★') or contains(text(), '⭐')]"
-            ],
-            'raters': [
-                "[class*='raters']",
-                "[class*='reviews']",
-                "xpath=//*[contains(@class, 'rating')]//span[2]",
-                "xpath=//*[contains(text(), 'review') or contains(text(), 'rating')]"
-            ]
-        }
-        
-        # Extract basic information with fallbacks
-        for key, selector_list in selectors.items():
-            venue_info[key] = "N/A"
-            
-            for selector in selector_list:
-                try:
-                    if selector.startswith("xpath="):
-                        elements = await page.query_selector_all(selector)
-                    else:
-                        elements = await page.query_selector_all(selector)
-                    
-                    for element in elements:
-                        if await element.is_visible():
-                            text = await self.extract_text_content(element)
-                            if text and text != "N/A" and len(text.strip()) > 0:
-                                venue_info[key] = text
-                                break
-                    
-                    if venue_info[key] != "N/A":
-                        break
-                        
-                except Exception as e:
-                    logger.debug(f"Selector {selector} failed for {key}: {str(e)}")
-                    continue
+        # Navigation already waited for domcontentloaded; wait for the heading
+        try:
+            await page.wait_for_selector("h1, h2, [class*='venue-name']", state="visible", timeout=10000)
+        except Exception as e:
+            logger.debug(f"Venue heading did not render: {str(e)}")
         
-        # Extract additional information using more flexible selectors
-        additional_info = {
-            'about_venue': ["[class*='about']", "[class*='description']", "xpath=//*[contains(@class, 'about') or contains(@class, 'description')]"],
-            'available_sports': ["[class*='sports']", "[class*='activities']", "xpath=//*[contains(@class, 'sports') or contains(@class, 'activities')]"],
-            'highlights': ["[class*='highlight']", "[class*='features']", "xpath=//*[contains(@class, 'highlight') or contains(@class, 'features')]"],
-            'amenities': ["[class*='amenities']", "[class*='facilities']", "xpath=//*[contains(@class, 'amenities') or contains(@class, 'facilities')]"],
-            'offer': ["[class*='offer']", "[class*='deal']", "xpath=//*[contains(@class, 'offer') or contains(@class, 'deal')]"]
-        }
+        # Extract every field, including modal contents, in one round trip
+        venue_info = await page.evaluate(EXTRACT_VENUE_JS, EXTRACT_VENUE_ARGS)
         
-        for key, selector_list in additional_info.items():
-            venue_info[key] = "N/A"
-            
-            for selector in selector_list:
-                try:
-                    if selector.startswith("xpath="):
-                        elements = await page.query_selector_all(selector)
-                    else:
-                        elements = await page.query_selector_all(selector)
-                    
-                    for element in elements:
-                        if await element.is_visible():
-                            text = await self.extract_text_content(element)
-                            if text and text != "N/A" and len(text.strip()) > 0:
-                                venue_info[key] = text
-                                break
-                    
-                    if venue_info[key] != "N/A":
-                        break
-                        
-                except Exception as e:
-                    logger.debug(f"Selector {selector} failed for {key}: {str(e)}")
-                    continue
-        
-        # Try to extract modal information (facilities, venue rules)
-        modal_info = ['facilities', 'venue_rules']
-        for modal_type in modal_info:
-            venue_info[modal_type] = "N/A"
-            
-            try:
-                # Look for buttons that might open modals
-                modal_buttons = await page.query_selector_all("button, div[role='button'], [class*='modal'], [class*='popup']")
-                
-                for button in modal_buttons:
-                    try:
-                        button_text = await button.text_content()
-                        if button_text and modal_type.replace('_', ' ').lower() in button_text.lower():
-                            if await button.is_visible():
-                                await self.safe_click(button, page)
-                                await asyncio.sleep(2)
-                                
-                                # Look for modal content
-                                modal_content = await page.query_selector("[role='dialog'], [class*='modal'], [class*='popup']")
-                                if modal_content:
-                                    content_text = await self.extract_text_content(modal_content)
-                                    if content_text and content_text != "N/A":
-                                        venue_info[modal_type] = content_text
-                                    
-                                    # Close modal
-                                    close_buttons = await page.query_selector_all("[aria-label*='close'], [class*='close'], button:has-text('×')")
-                                    for close_btn in close_buttons:
-                                        if await close_btn.is_visible():
-                                            await self.safe_click(close_btn, page)
-                                            break
-                                
-                                break
-                    except Exception as e:
-                        logger.debug(f"Modal extraction failed: {str(e)}")
-                        continue
-                        
-            except Exception as e:
-                logger.warning(f"Failed to extract {modal_type}: {str(e)}")
+        for key in MULTILINE_FIELDS & venue_info.keys():
+            if venue_info[key] != NA:
+                venue_info[key] = self.clean_text(venue_info[key])
         
         # Get page URL as additional info
         venue_info['url'] = page.url
@@ -399,183 +881,465 @@ class VenueScraper:
         
         return venue_info
     
-    async def scrape_city_venues(self, city):
+    async def launch_browser(self, playwright):
+        """Launch the shared headless Chromium instance"""
+        return await playwright.chromium.launch(
+            headless=True,
+            args=[
+                '--no-sandbox',
+                '--disable-dev-shm-usage',
+                '--disable-extensions',
+                '--disable-background-timer-throttling',
+                '--disable-backgrounding-occluded-windows',
+                '--disable-renderer-backgrounding',
+                '--disable-blink-features=AutomationControlled',
+                # Background features that only cost memory and CPU per context
+                '--disable-features=TranslateUI,OptimizationHints,MediaRouter,site-per-process,IsolateOrigins,VizDisplayCompositor',
+                '--disable-component-extensions-with-background-pages',
+                '--disable-default-apps',
+                '--disable-sync',
+                '--disable-background-networking',
+                '--disable-breakpad',
+                '--disable-client-side-phishing-detection',
+                '--disable-hang-monitor',
+                '--disable-ipc-flooding-protection',
+                '--metrics-recording-only',
+                '--mute-audio',
+                '--no-first-run',
+                '--no-default-browser-check',
+                # Images are aborted in context.route too; this skips decoding entirely
+                '--blink-settings=imagesEnabled=false'
+            ]
+        )
+    
+    async def new_context(self, browser):
+        """Create a browser context with a realistic viewport and user agent"""
+        options = dict(
+            viewport={"width": 1280, "height": 900},
+            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            # Service workers would bypass the request blocking in context.route
+            service_workers='block'
+        )
+        
+        # A saved session is an optimisation; a corrupt file must not fail every city
+        context = None
+        if os.path.exists(STATE_FILE):
+            try:
+                context = await browser.new_context(**options, storage_state=STATE_FILE)
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable {STATE_FILE}: {str(e)}")
+        if context is None:
+            context = await browser.new_context(**options)
+        # Fail fast on missing elements; callers fall back or move on
+        context.set_default_timeout(ACTION_TIMEOUT)
+        context.set_default_navigation_timeout(NAVIGATION_TIMEOUT)
+        await context.add_init_script(SCRAPER_INIT_JS)
+        await context.route("**/*", self.block_unneeded_requests)
+        context.on("response", self.honor_rate_limits)
+        return context
+    
+    def honor_rate_limits(self, response):
+        """Pause the host's bucket when a response says its budget is spent"""
+        headers = response.headers
+        if response.status in (429, 503) and headers.get('retry-after'):
+            seconds = self.parse_retry_after(headers['retry-after'])
+        elif headers.get('x-ratelimit-remaining', '').strip() == '0':
+            # Reset is either seconds from now or an epoch timestamp
+            try:
+                reset = float(headers.get('x-ratelimit-reset', ''))
+            except ValueError:
+                return
+            seconds = reset - time.time() if reset > 1e9 else reset
+        else:
+            return
+        if seconds is None:
+            return
+        
+        logger.warning(f"HTTP {response.status} from {response.url}, pausing {seconds:.0f}s")
+        self.bucket_for(response.url).pause(max(0.0, seconds))
+    
+    def parse_retry_after(self, retry_after):
+        """Seconds to wait from a Retry-After header, or None if unparseable"""
+        try:
+            return float(retry_after)
+        except ValueError:
+            try:
+                return (parsedate_to_datetime(retry_after) - datetime.now().astimezone()).total_seconds()
+            except (TypeError, ValueError):
+                return None
+    
+    def bucket_for(self, url):
+        """Get the token bucket for a URL's host"""
+        host = urlparse(url).netloc
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(RATE_LIMIT_RPS)
+        return self._buckets[host]
+    
+    async def navigate(self, page, url):
+        """Navigate within the global in-flight cap and the host's rate limit"""
+        # Bounded by the context's NAVIGATION_TIMEOUT
+        async with self._inflight, self.bucket_for(url):
+            return await page.goto(url, wait_until="domcontentloaded")
+    
+    def _start_run(self, max_venue_loads):
+        """Create the per-run asyncio primitives on the running loop"""
+        self._lock = asyncio.Lock()
+        self._inflight = asyncio.BoundedSemaphore(MAX_INFLIGHT)
+        self._buckets = {}
+        self._state_saved = False
+        self._last_flush = 0.0
+        self.controller = AIMDController(maximum=max_venue_loads)
+    
+    async def block_unneeded_requests(self, route):
+        """Abort images, media, fonts and tracker requests"""
+        request = route.request
+        if (request.resource_type in BLOCKED_RESOURCE_TYPES
+                or any(host in request.url for host in BLOCKED_HOSTS)):
+            await route.abort()
+        else:
+            await route.continue_()
+    
+    async def scrape_city_venues(self, pool, city):
         """Scrape venues for a specific city"""
         logger.info(f"Starting to scrape venues for {city}")
         city_venues = []
+        context = None
         
-        async with async_playwright() as playwright:
-            try:
-                # Launch browser
-                browser = await playwright.chromium.launch(
-                    headless=True,
-                    args=[
-                        '--no-sandbox',
-                        '--disable-dev-shm-usage',
-                        '--disable-gpu',
-                        '--disable-extensions',
-                        '--disable-background-timer-throttling',
-                        '--disable-backgrounding-occluded-windows',
-                        '--disable-renderer-backgrounding',
-                        '--disable-blink-features=AutomationControlled'
-                    ]
-                )
+        try:
+            # Borrow a context from the pool shared by all cities
+            context = await pool.acquire()
+            
+            # A listing harvested within its TTL skips the load-more pass
+            venue_urls = await asyncio.to_thread(self.cache.get_listing, city)
+            if venue_urls is None:
+                page = await context.new_page()
                 
-                page = await browser.new_page()
+                url = CITY_URLS.get(city) or CITY_URL_TEMPLATE.format(city)
+                logger.info(f"Navigating to: {url}")
                 
-                # Set realistic viewport and user agent
-                await page.set_viewport_size({"width": 1920, "height": 1080})
-                await page.set_extra_http_headers({
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                })
+                # Heavy assets are blocked, so the document arrives well within the timeout
+                await self.navigate(page, url)
                 
-                url = f"https://www.khelomore.com/sports-venues/{city}/sports/all"
-                logger.info(f"Navigating to: {url}")
+                # Load all venues and collect their detail URLs in one pass
+                venue_urls = await self.load_all_venues(page)
                 
-                await page.goto(url, wait_until="domcontentloaded", timeout=60000)
-                await asyncio.sleep(5)
+                # The listing is never revisited, close it before the detail pass
+                await page.close()
                 
-                # Load all venues
-                total_venues = await self.load_all_venues(page)
+                if venue_urls:
+                    await asyncio.to_thread(self.cache.put_listing, city, venue_urls)
                 
-                if total_venues == 0:
-                    logger.warning(f"No venues found for {city}")
-                    return city_venues
+                # Keep the session from the first listing that loaded for later runs
+                if venue_urls and not self._state_saved:
+                    self._state_saved = True
+                    state = await context.storage_state()
+                    await asyncio.to_thread(self._save_state_sync, state)
+            else:
+                logger.info(f"Using cached listing for {city}: {len(venue_urls)} venues")
+            
+            venue_urls = venue_urls[:50]  # Limit per city
+            
+            if not venue_urls:
+                logger.warning(f"No venues found for {city}")
+                return city_venues
+            
+            # Reuse venues scraped within the cache TTL, only fetch the rest. A venue
+            # can be listed under several cities, so label it with this one
+            cached = await asyncio.to_thread(self.cache.get_many, venue_urls)
+            city_venues.extend(dict(venue_info, city=city) for venue_info in cached.values())
+            venue_urls = [venue_url for venue_url in venue_urls if venue_url not in cached]
+            logger.info(f"{len(cached)} cached venues in {city}, {len(venue_urls)} to scrape")
+            
+            queue = asyncio.Queue()
+            for venue_url in venue_urls:
+                queue.put_nowait(venue_url)
+            
+            # Fan detail extraction out across pages sharing the city's context
+            workers = [
+                asyncio.ensure_future(self._venue_worker(context, queue, city, city_venues))
+                for _ in range(min(VENUE_CONCURRENCY, len(venue_urls)))
+            ]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                # If one worker failed (or the city was cancelled), stop the rest
+                # before the context goes back to the pool for another city
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+            
+            logger.info(f"Completed scraping {city}: {len(city_venues)} venues")
+            
+        except Exception as e:
+            logger.error(f"Error scraping city {city}: {str(e)}")
+            self.failed_cities.append(city)
+        finally:
+            if context:
+                await pool.release(context)
+        
+        return city_venues
+    
+    async def _venue_worker(self, context, queue, city, city_venues):
+        """Extract venues from the queue, loading the next one in a second page"""
+        current_page = await context.new_page()
+        next_page = await context.new_page()
+        
+        try:
+            venue_url = self._next_url(queue)
+            loaded = await self._load_venue(current_page, venue_url) if venue_url else False
+            
+            while venue_url:
+                next_url = self._next_url(queue)
                 
-                # Get all venue elements
-                venue_elements = await self.get_venue_elements(page)
+                # Navigate to the next venue while the current one is extracted
+                if next_url:
+                    venue_info, next_loaded = await asyncio.gather(
+                        self._scrape_venue(current_page, venue_url, city, loaded),
+                        self._load_venue(next_page, next_url)
+                    )
+                else:
+                    venue_info = await self._scrape_venue(current_page, venue_url, city, loaded)
+                    next_loaded = False
                 
-                # Process venues
-                processed_count = 0
-                max_retries = 3
+                if venue_info:
+                    city_venues.append(venue_info)
                 
-                for i, venue in enumerate(venue_elements):
-                    if processed_count >= min(total_venues, 50):  # Limit per city
-                        break
-                        
-                    retry_count = 0
-                    
-                    while retry_count < max_retries:
-                        try:
-                            logger.info(f"Processing venue {processed_count + 1}/{min(total_venues, 50)} in {city}")
-                            
-                            # Scroll venue into view and click
-                            await venue.scroll_into_view_if_needed()
-                            await asyncio.sleep(1)
-                            
-                            # Try clicking the venue
-                            success = await self.safe_click(venue, page)
-                            if not success:
-                                # Try alternative click methods
-                                await page.evaluate("arguments[0].click()", venue)
-                                await asyncio.sleep(2)
-                            
-                            # Wait for venue details page
-                            await page.wait_for_load_state("domcontentloaded", timeout=30000)
-                            await asyncio.sleep(3)
-                            
-                            # Extract venue data
-                            venue_info = await self.extract_venue_data(page)
-                            venue_info['city'] = city
-                            venue_info['scraped_at'] = datetime.now().isoformat()
-                            
-                            city_venues.append(venue_info)
-                            logger.info(f"Scraped: {venue_info.get('name', 'Unknown')} in {city}")
-                            
-                            # Go back to list
-                            await page.go_back()
-                            await page.wait_for_load_state("domcontentloaded", timeout=30000)
-                            await asyncio.sleep(3)
-                            
-                            # Re-get venue elements as they might be stale
-                            venue_elements = await self.get_venue_elements(page)
-                            
-                            break  # Success, exit retry loop
-                            
-                        except Exception as e:
-                            logger.error(f"Error processing venue {processed_count + 1} in {city}, attempt {retry_count + 1}: {str(e)}")
-                            retry_count += 1
-                            
-                            if retry_count < max_retries:
-                                try:
-                                    await page.go_back()
-                                    await page.wait_for_load_state("domcontentloaded", timeout=30000)
-                                    await asyncio.sleep(3)
-                                    venue_elements = await self.get_venue_elements(page)
-                                except:
-                                    pass
-                            else:
-                                logger.error(f"Failed to process venue {processed_count + 1} in {city} after {max_retries} attempts")
-                    
-                    processed_count += 1
+                current_page, next_page = next_page, current_page
+                venue_url, loaded = next_url, next_loaded
+        finally:
+            await current_page.close()
+            await next_page.close()
+    
+    def _next_url(self, queue):
+        """Take the next venue URL from the queue, or None when it is empty"""
+        try:
+            return queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+    
+    async def goto_venue(self, page, venue_url):
+        """Navigate to a venue page, feeding latency and errors to the controller"""
+        async with self.controller:
+            started = time.perf_counter()
+            try:
+                response = await self.navigate(page, venue_url)
+            except Exception:
+                self.controller.on_error()
+                raise
+            
+            if response and (response.status == 429 or response.status >= 500):
+                self.controller.on_error()
+                raise Exception(f"HTTP {response.status} for {venue_url}")
+            self.controller.on_success(time.perf_counter() - started)
+    
+    async def _load_venue(self, page, venue_url):
+        """Navigate a page to a venue, returning whether it loaded"""
+        try:
+            await self.goto_venue(page, venue_url)
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to load venue {venue_url}: {str(e)}")
+            return False
+    
+    async def _scrape_venue(self, page, venue_url, city, loaded):
+        """Extract one venue within VENUE_TIMEOUT, or give up on it"""
+        # A pathological page is cancelled instead of stalling its worker
+        try:
+            return await asyncio.wait_for(self._try_scrape_venue(page, venue_url, city, loaded), VENUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error(f"Gave up on venue {venue_url} in {city} after {VENUE_TIMEOUT}s")
+            return None
+    
+    async def _try_scrape_venue(self, page, venue_url, city, loaded):
+        """Extract one venue, navigating first unless the page is already loaded"""
+        max_retries = 3
+        
+        for attempt in range(max_retries):
+            try:
+                logger.info(f"Processing venue {venue_url} in {city}")
                 
-                await browser.close()
-                logger.info(f"Completed scraping {city}: {len(city_venues)} venues")
+                if not loaded:
+                    await self.goto_venue(page, venue_url)
+                
+                # Extract venue data
+                venue_info = await self.extract_venue_data(page)
+                venue_info['city'] = city
+                venue_info['scraped_at'] = datetime.now().isoformat()
+                
+                logger.info(f"Scraped: {venue_info.get('name', 'Unknown')} in {city}")
+                await asyncio.to_thread(self.cache.put, venue_url, venue_info)
+                return venue_info
                 
             except Exception as e:
-                logger.error(f"Error scraping city {city}: {str(e)}")
-                self.failed_cities.append(city)
-                try:
-                    await browser.close()
-                except:
-                    pass
+                logger.error(f"Error processing venue {venue_url} in {city}, attempt {attempt + 1}: {str(e)}")
+                loaded = False
+                if attempt < max_retries - 1:
+                    await backoff(attempt)
         
-        return city_venues
+        logger.error(f"Failed to process venue {venue_url} in {city} after {max_retries} attempts")
+        return None
     
-    async def scrape_all_cities(self):
-        """Scrape venues from all cities"""
-        logger.info("Starting to scrape all cities")
-        
-        for city in CITIES:
+    async def scrape_single_city(self, city):
+        """Scrape one city with its own browser (used by the test endpoint)"""
+        async with async_playwright() as playwright:
+            self._start_run(max_venue_loads=VENUE_CONCURRENCY * 2)
+            browser = await self.launch_browser(playwright)
+            pool = ContextPool(lambda: self.new_context(browser), 1)
             try:
-                city_venues = await self.scrape_city_venues(city)
-                self.venues_data.extend(city_venues)
-                self.scraped_cities.append(city)
-                
-                # Save progress after each city
-                self.save_progress()
+                return await self.scrape_city_venues(pool, city)
+            finally:
+                await pool.close()
+                await browser.close()
+    
+    async def _bounded(self, semaphore, pool, city):
+        """Scrape a city once a concurrency slot is free"""
+        async with semaphore:
+            try:
+                city_venues = await self.scrape_city_venues(pool, city)
                 
-                # Add delay between cities to avoid rate limiting
-                await asyncio.sleep(15)
+                # Shared state is mutated by several city tasks at once
+                async with self._lock:
+                    self.total_venues += len(city_venues)
+                    # scrape_city_venues records its own failures, don't count them twice
+                    if city not in self.failed_cities:
+                        self.scraped_cities.append(city)
+                    await asyncio.to_thread(self.append_venues, city_venues)
+                    
+                    # Save progress after each city
+                    await self.save_progress()
                 
             except Exception as e:
                 logger.error(f"Failed to scrape {city}: {str(e)}")
                 self.failed_cities.append(city)
-                continue
+    
+    async def scrape_all_cities(self):
+        """Scrape venues from all cities, returning how many were written"""
+        logger.info(f"Starting to scrape all cities ({MAX_CITY_CONCURRENCY} at a time)")
+        
+        # Created here so the lock, limits and controller bind to the loop running the scrape
+        self._start_run(max_venue_loads=MAX_CITY_CONCURRENCY * VENUE_CONCURRENCY * 2)
+        
+        # Start a fresh output file, venues are appended as cities finish
+        open(VENUES_FILE, 'w').close()
+        semaphore = asyncio.BoundedSemaphore(MAX_CITY_CONCURRENCY)
+        
+        async with async_playwright() as playwright:
+            browser = await self.launch_browser(playwright)
+            
+            # One context per concurrently scraped city
+            pool = ContextPool(lambda: self.new_context(browser), MAX_CITY_CONCURRENCY)
+            try:
+                tasks = [self._bounded(semaphore, pool, city) for city in CITIES]
+                await asyncio.gather(*tasks, return_exceptions=True)
+            finally:
+                await pool.close()
+                await browser.close()
+                # Flush whatever the throttle held back, even when cancelled
+                await self.save_progress(force=True)
         
-        logger.info(f"Scraping completed. Total venues: {len(self.venues_data)}")
+        logger.info(f"Scraping completed. Total venues: {self.total_venues}")
         logger.info(f"Successful cities: {len(self.scraped_cities)}")
         logger.info(f"Failed cities: {len(self.failed_cities)}")
         
-        return self.venues_data
-    
-    def save_progress(self):
-        """Save current progress to files"""
-        # Save JSON
-        with open('venues_data.json', 'w', encoding='utf-8') as f:
-            json.dump(self.venues_data, f, indent=2, ensure_ascii=False)
-        
-        # Save Excel
-        if self.venues_data:
-            df = pd.DataFrame(self.venues_data)
-            df.to_excel('venues_data.xlsx', index=False)
-        
-        # Save progress log
-        progress = {
-            'scraped_cities': self.scraped_cities,
-            'failed_cities': self.failed_cities,
-            'total_venues': len(self.venues_data),
-            'last_updated': datetime.now().isoformat()
+        return self.total_venues
+    
+    def append_venues(self, venues):
+        """Append scraped venues to the newline-delimited JSON output"""
+        # One write per city, so readers see the batch's lines all at once
+        with open(VENUES_FILE, 'ab') as f:
+            f.write(b''.join(orjson.dumps(venue) + b'\n' for venue in venues))
+    
+    def progress(self):
+        """Snapshot of the current run for /status and progress.json"""
+        return {
+            'scraped_cities': list(self.scraped_cities),
+            'failed_cities': list(self.failed_cities),
+            'total_venues': self.total_venues,
+            'last_updated': self.last_updated
         }
+    
+    async def save_progress(self, force=False):
+        """Save current progress to files without blocking the event loop"""
+        self.last_updated = datetime.now().isoformat()
+        
+        # /status reads live state from memory, so the file only needs to
+        # keep up at PROGRESS_FLUSH_INTERVAL when cities finish in bursts
+        now = time.monotonic()
+        if not force and now - self._last_flush < PROGRESS_FLUSH_INTERVAL:
+            return
+        self._last_flush = now
         
-        with open('progress.json', 'w', encoding='utf-8') as f:
-            json.dump(progress, f, indent=2, ensure_ascii=False)
+        # Snapshot on the loop so the writer thread never sees lists mid-update
+        progress = self.progress()
+        await asyncio.to_thread(self._save_progress_sync, progress)
+    
+    def _save_state_sync(self, state):
+        """Write the session state (runs in a worker thread)"""
+        # New contexts load this file at any time, and concurrent test jobs may
+        # save at once, so each writes its own temp file and renames it
+        tmp_file = f'{STATE_FILE}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(orjson.dumps(state))
+        os.replace(tmp_file, STATE_FILE)
+    
+    def _save_progress_sync(self, progress):
+        """Write the progress log (runs in a worker thread)"""
+        # Write then rename so /status never reads a half-written file
+        tmp_file = f'{PROGRESS_FILE}.tmp'
+        with open(tmp_file, 'wb') as f:
+            # Compact, since /status serves these bytes as they are
+            f.write(orjson.dumps(progress))
+        os.replace(tmp_file, PROGRESS_FILE)
         
-        logger.info(f"Progress saved: {len(self.venues_data)} venues")
+        logger.info(f"Progress saved: {progress['total_venues']} venues")
 
 # Flask app for Railway deployment
 app = Flask(__name__)
 
+# Compress the HTML page and /status polls; the xlsx download is already zipped
+app.config['COMPRESS_MIMETYPES'] = ['text/html', 'application/json']
+app.config['COMPRESS_LEVEL'] = 6
+Compress(app)
+
+# Long-lived event loop on a daemon thread that every scrape is submitted to
+_loop = None
+_loop_lock = threading.Lock()
+
+# Background scrape started by /start_scraping, guarded against double starts
+_scrape_lock = threading.Lock()
+# Job id, scraper and future of the latest run, so /status reads live state from memory
+_current_job = None
+# /test_city scrapes by job id, removed once the result is fetched or, if
+# nobody collects it, TEST_JOB_TTL seconds after the scrape finished
+_test_jobs = {}
+_test_jobs_lock = threading.Lock()
+# Serialises Excel rebuilds between request threads
+_excel_lock = threading.Lock()
+# One SQLite cache connection shared by every scraper this process creates
+_cache = None
+
+def get_loop():
+    """Return the background event loop, starting its thread on first use"""
+    global _loop
+    # Started lazily so a pre-forking server never forks a running loop thread
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True).start()
+        return _loop
+
+def new_scraper():
+    """Create a scraper for one job, reusing the process-wide cache"""
+    global _cache
+    with _loop_lock:
+        if _cache is None:
+            _cache = VenueCache()
+    return VenueScraper(cache=_cache)
+
+def submit(coro):
+    """Schedule a coroutine on the background loop and return its future"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html>
@@ -611,8 +1375,8 @@ HTML_TEMPLATE = """
                 <li><strong>Smart Load More:</strong> Enhanced button detection with multiple patterns</li>
                 <li><strong>Robust Data Extraction:</strong> Fallback selectors for each data field</li>
                 <li><strong>Better Error Handling:</strong> Retries and graceful degradation</li>
-                <li><strong>Stale Element Prevention:</strong> Re-queries elements after navigation</li>
-                <li><strong>Rate Limiting:</strong> Increased delays to avoid being blocked</li>
+                <li><strong>Direct Venue Links:</strong> Collects every venue URL from the listing once instead of clicking through cards</li>
+                <li><strong>Rate Limiting:</strong> Per-host request budget that pauses on Retry-After and adapts to errors</li>
             </ul>
         </div>
         
@@ -641,7 +1405,9 @@ HTML_TEMPLATE = """
         <div style="text-align: center; margin: 30px 0;">
             <button onclick="startScraping()">🚀 Start Scraping</button>
             <button onclick="checkStatus()">📊 Check Status</button>
+            <button onclick="cancelScraping()">⏹️ Stop Scraping</button>
             <button onclick="downloadExcel()">📥 Download Excel</button>
+            <button onclick="downloadCsv()">📄 Download CSV</button>
         </div>
         
         <div id="status" class="progress"></div>
@@ -662,6 +1428,20 @@ HTML_TEMPLATE = """
                 }
             }
             
+            async function cancelScraping() {
+                try {
+                    const response = await fetch('/cancel_scraping', {method: 'POST'});
+                    const result = await response.json();
+                    if (result.error) {
+                        document.getElementById('status').innerHTML = `<div class="warning">⚠️ ${result.error}</div>`;
+                    } else {
+                        document.getElementById('status').innerHTML = `<div class="success">✅ ${result.message}</div>`;
+                    }
+                } catch (error) {
+                    document.getElementById('status').innerHTML = `<div class="error">❌ Error: ${error.message}</div>`;
+                }
+            }
+            
             async function checkStatus() {
                 try {
                     const response = await fetch('/status');
@@ -684,6 +1464,10 @@ HTML_TEMPLATE = """
                 window.location.href = '/download_excel';
             }
             
+            function downloadCsv() {
+                window.location.href = '/download_csv';
+            }
+            
             // Auto-refresh status every 30 seconds when scraping
             setInterval(checkStatus, 30000);
         </script>
@@ -692,53 +1476,256 @@ HTML_TEMPLATE = """
 </html>
 """
 
+# CITIES is fixed, so the page is rendered once at import instead of per request
+INDEX_HTML = Template(HTML_TEMPLATE).render(cities=CITIES).encode()
+INDEX_ETAG = hashlib.sha1(INDEX_HTML).hexdigest()
+
+def conditional_response(response):
+    """Tag a response with an ETag so unchanged polls get an empty 304"""
+    # Keeps an ETag the caller already set
+    response.add_etag()
+    response.headers['Cache-Control'] = 'no-cache'
+    
+    # Flask-Compress sends compressed bodies as "<etag>:gzip" / "<etag>:br",
+    # so compare the client's tags without that suffix
+    etag, _ = response.get_etag()
+    client_etags = request.if_none_match.as_set(include_weak=True)
+    if etag in {tag.split(':', 1)[0] for tag in client_etags}:
+        not_modified = app.response_class(status=304)
+        not_modified.set_etag(etag)
+        not_modified.headers['Cache-Control'] = 'no-cache'
+        return not_modified
+    return response
+
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE, cities=CITIES)
+    # The page is a constant: bytes and ETag are ready, only the 304 check runs
+    response = app.response_class(INDEX_HTML, mimetype='text/html')
+    response.set_etag(INDEX_ETAG)
+    return conditional_response(response)
+
+def start_job(job, coro):
+    """Run coro as job['task'] on the background loop"""
+    # job['finished'] is set by the task itself, after its cleanup has run.
+    # A cancelled concurrent future reports done() while cleanup continues
+    job['finished'] = threading.Event()
+    
+    def create_task():
+        job['task'] = asyncio.ensure_future(coro)
+        job['task'].add_done_callback(lambda task: finish_job(job, task))
+    
+    get_loop().call_soon_threadsafe(create_task)
+
+def finish_job(job, task):
+    """Log a background scrape that ended with an exception and mark it finished"""
+    if not task.cancelled() and task.exception():
+        logger.error(f"Background scrape failed: {str(task.exception())}")
+    job['finished'].set()
+
+def cancel_job(job):
+    """Cancel a job's task; queued after create_task, so the task exists by then"""
+    get_loop().call_soon_threadsafe(lambda: job['task'].cancel())
 
 @app.route('/start_scraping', methods=['POST'])
 def start_scraping():
+    global _current_job
+    try:
+        with _scrape_lock:
+            # A cancelled run counts as running until its cleanup is done, so
+            # a new run never truncates files the old one is still writing
+            if _current_job and not _current_job['finished'].is_set():
+                return jsonify({'error': 'Scraping is already running', 'job_id': _current_job['job_id']}), 409
+            
+            # Run scraping in background so /status stays responsive
+            scraper = new_scraper()
+            _current_job = {'job_id': uuid.uuid4().hex, 'scraper': scraper}
+            start_job(_current_job, scraper.scrape_all_cities())
+        return jsonify({
+            'message': 'Scraping started in the background. Use Check Status to follow progress.',
+            'job_id': _current_job['job_id']
+        }), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# /status body before any scrape has saved progress
+NO_PROGRESS_JSON = orjson.dumps({
+    'total_venues': 0,
+    'scraped_cities': 0,
+    'failed_cities': 0,
+    'last_updated': 'Never'
+})
+
+def json_response(body):
+    """Conditional JSON response from already serialised bytes"""
+    return conditional_response(app.response_class(body, mimetype='application/json'))
+
+@app.route('/cancel_scraping', methods=['POST'])
+def cancel_scraping():
     try:
-        # Run scraping in background
-        scraper = VenueScraper()
-        asyncio.run(scraper.scrape_all_cities())
-        return jsonify({'message': 'Scraping completed successfully'})
+        with _scrape_lock:
+            if not _current_job or _current_job['finished'].is_set():
+                return jsonify({'error': 'No scraping is running'}), 409
+            
+            # Cancels the task on the background loop; the browser is closed
+            # by scrape_all_cities' cleanup and finished cities stay saved
+            cancel_job(_current_job)
+        return jsonify({'message': 'Scraping is being cancelled.', 'job_id': _current_job['job_id']})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/status')
 def status():
     try:
-        if os.path.exists('progress.json'):
-            with open('progress.json', 'r') as f:
-                progress = json.load(f)
-            return jsonify(progress)
+        # Live state of this process's run, no file round trip
+        job = _current_job
+        if job:
+            progress = job['scraper'].progress()
+            progress['job_id'] = job['job_id']
+            progress['running'] = not job['finished'].is_set()
+            return json_response(orjson.dumps(progress))
+        if os.path.exists(PROGRESS_FILE):
+            # The file is already JSON written by orjson, serve it as is
+            with open(PROGRESS_FILE, 'rb') as f:
+                return json_response(f.read())
         else:
-            return jsonify({
-                'total_venues': 0,
-                'scraped_cities': 0,
-                'failed_cities': 0,
-                'last_updated': 'Never'
-            })
+            return json_response(NO_PROGRESS_JSON)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def iter_venues():
+    """Yield venues from the NDJSON output, skipping unreadable lines"""
+    # Exports read this while the scraper appends, and the CSV has already sent
+    # its headers, so a bad line is logged and skipped rather than raised
+    with open(VENUES_FILE, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                return  # Still being appended by the scraper
+            try:
+                venue = orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                logger.warning(f"Skipping unreadable line in {VENUES_FILE}: {str(e)}")
+                continue
+            yield venue
+
+def build_excel():
+    """Write the Excel export from the NDJSON output if it is out of date"""
+    # Only one request rebuilds at a time; the others wait and reuse its file
+    with _excel_lock:
+        # The workbook carries the mtime of the source it was built from, taken
+        # before reading, so venues appended during a build trigger the next one
+        source = os.stat(VENUES_FILE)
+        if os.path.exists(EXCEL_FILE) and os.stat(EXCEL_FILE).st_mtime_ns == source.st_mtime_ns:
+            return
+        
+        # Stream rows from the NDJSON file; constant_memory flushes each row to disk.
+        # Built aside and renamed so send_file never streams a half-written file
+        tmp_file = f'{EXCEL_FILE}.tmp'
+        workbook = xlsxwriter.Workbook(tmp_file, {'constant_memory': True})
+        try:
+            worksheet = workbook.add_worksheet()
+            worksheet.write_row(0, 0, EXPORT_COLUMNS)
+            for row, venue in enumerate(iter_venues(), start=1):
+                worksheet.write_row(row, 0, [venue.get(col) or '' for col in EXPORT_COLUMNS])
+        finally:
+            workbook.close()
+        os.utime(tmp_file, ns=(source.st_atime_ns, source.st_mtime_ns))
+        os.replace(tmp_file, EXCEL_FILE)
+
 @app.route('/download_excel')
 def download_excel():
     try:
-        if os.path.exists('venues_data.xlsx'):
-            return send_file('venues_data.xlsx', as_attachment=True)
+        if os.path.exists(VENUES_FILE) and os.path.getsize(VENUES_FILE) > 0:
+            if os.path.getsize(VENUES_FILE) > MAX_EXCEL_SOURCE_BYTES:
+                return "Export too large for Excel, use /download_csv", 413
+            build_excel()
+            # Conditional + Range support lets browsers resume or get a 304
+            # Absolute, as send_file resolves relative paths against the app root,
+            # not the working directory the export was written to
+            return send_file(os.path.abspath(EXCEL_FILE), as_attachment=True, conditional=True, etag=True, max_age=0)
+        else:
+            return "No data available for download", 404
+    except Exception as e:
+        return f"Error: {str(e)}", 500
+
+def generate_csv():
+    """Yield the NDJSON output as CSV in chunks of roughly 64KB"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for venue in iter_venues():
+        writer.writerow([venue.get(col) or '' for col in EXPORT_COLUMNS])
+        if buffer.tell() >= 65536:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+@app.route('/download_csv')
+def download_csv():
+    try:
+        if os.path.exists(VENUES_FILE) and os.path.getsize(VENUES_FILE) > 0:
+            # Streamed row by row, so memory stays flat at any size
+            return app.response_class(generate_csv(), mimetype='text/csv', headers={
+                'Content-Disposition': 'attachment; filename=venues_data.csv'
+            })
         else:
             return "No data available for download", 404
     except Exception as e:
         return f"Error: {str(e)}", 500
 
+def prune_test_jobs():
+    """Forget finished test jobs whose result was never fetched (call under the lock)"""
+    now = time.monotonic()
+    for job_id, job in list(_test_jobs.items()):
+        if job['finished_at'] is not None and now - job['finished_at'] > TEST_JOB_TTL:
+            del _test_jobs[job_id]
+
+def mark_test_job_finished(job):
+    """Record when a test job's scrape ended, for expiry"""
+    def callback(future):
+        job['finished_at'] = time.monotonic()
+    return callback
+
 @app.route('/test_city/<city>')
 def test_city(city):
-    """Test scraping a single city"""
+    """Test scraping a single city; poll with ?job=<job_id> until it returns 200"""
     try:
-        scraper = VenueScraper()
-        city_data = asyncio.run(scraper.scrape_city_venues(city))
+        job_id = request.args.get('job')
+        if not job_id:
+            with _test_jobs_lock:
+                prune_test_jobs()
+                # Each test scrape launches its own Chromium, so cap them
+                running = sum(not job['future'].done() for job in _test_jobs.values())
+                if running >= MAX_TEST_JOBS:
+                    response = jsonify({'error': 'Too many test scrapes running', 'city': city})
+                    response.headers['Retry-After'] = '30'
+                    return response, 429
+                
+                # Start the scrape and return at once instead of holding the request
+                scraper = new_scraper()
+                job_id = uuid.uuid4().hex
+                job = {'future': submit(scraper.scrape_single_city(city)), 'finished_at': None}
+                job['future'].add_done_callback(mark_test_job_finished(job))
+                _test_jobs[job_id] = job
+            response = jsonify({'city': city, 'job_id': job_id, 'status': 'running'})
+            response.headers['Location'] = f'/test_city/{city}?job={job_id}'
+            response.headers['Retry-After'] = '2'
+            return response, 202
+        
+        with _test_jobs_lock:
+            prune_test_jobs()
+            job = _test_jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Unknown job', 'city': city}), 404
+        future = job['future']
+        if not future.done():
+            response = jsonify({'city': city, 'job_id': job_id, 'status': 'running'})
+            response.headers['Retry-After'] = '2'
+            return response, 202
+        
+        with _test_jobs_lock:
+            _test_jobs.pop(job_id, None)
+        city_data = future.result()
         return jsonify({
             'city': city,
             'venues_found': len(city_data),
@@ -750,4 +1737,5 @@ def test_city(city):
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
-    app.run(host="0.0.0.0", port=port, debug=True)
\ No newline at end of file
+    # No reloader: it forks a second process and restarts on progress.json writes
+    app.run(host="0.0.0.0", port=port, debug=False, threaded=True)
\ No newline at end of file
@@ -0,0 +1,249 @@
+import asyncio
+import concurrent.futures
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+
+import pytest
+
+import app as scraper_app
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # Keep progress.json and the other output files out of the repo
+    monkeypatch.chdir(tmp_path)
+    return scraper_app.app.test_client()
+
+
+@pytest.mark.parametrize('path', ['/', '/status'])
+@pytest.mark.parametrize('encoding', ['identity', 'gzip', 'br'])
+def test_unchanged_response_revalidates_to_304(client, path, encoding):
+    first = client.get(path, headers={'Accept-Encoding': encoding})
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    second = client.get(path, headers={'Accept-Encoding': encoding, 'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.data == b''
+
+
+def test_changed_etag_gets_full_response(client):
+    response = client.get('/status', headers={'Accept-Encoding': 'gzip', 'If-None-Match': '"stale:gzip"'})
+    assert response.status_code == 200
+
+
+def test_download_excel_skips_bad_and_partial_lines(client):
+    with open(scraper_app.VENUES_FILE, 'wb') as f:
+        f.write(b'{"name": "Turf A", "city": "pune"}\nnot json\n{"name": "Tur')
+
+    response = client.get('/download_excel')
+    assert response.status_code == 200
+    assert response.data.startswith(b'PK')
+    response.close()
+
+
+def test_venues_appended_during_excel_build_trigger_a_rebuild(client, monkeypatch):
+    with open(scraper_app.VENUES_FILE, 'wb') as f:
+        f.write(b'{"name": "Turf A", "city": "pune"}\n')
+    read_venues = scraper_app.iter_venues
+    builds = []
+
+    def iter_venues_and_append_once():
+        builds.append(True)
+        yield from read_venues()
+        if len(builds) == 1:
+            # The last city of a run lands after the rows were read
+            with open(scraper_app.VENUES_FILE, 'ab') as f:
+                f.write(b'{"name": "Turf B", "city": "pune"}\n')
+
+    monkeypatch.setattr(scraper_app, 'iter_venues', iter_venues_and_append_once)
+    scraper_app.build_excel()
+    scraper_app.build_excel()
+    assert len(builds) == 2
+    scraper_app.build_excel()
+    assert len(builds) == 2
+
+
+def test_download_csv_skips_bad_and_partial_lines(client):
+    with open(scraper_app.VENUES_FILE, 'wb') as f:
+        f.write(b'{"name": "Turf A"}\nnot json\n{"name": "Turf B"}\n{"name": "Tur')
+
+    response = client.get('/download_csv')
+    assert response.status_code == 200
+    rows = response.get_data(as_text=True).splitlines()
+    assert rows[0].startswith('name,')
+    assert [row.split(',')[0] for row in rows[1:]] == ['Turf A', 'Turf B']
+
+
+@pytest.fixture
+def pending_test_jobs(monkeypatch):
+    # Stand in for the browser scrape with futures the test settles itself
+    futures = []
+
+    def fake_submit(coro):
+        coro.close()
+        futures.append(concurrent.futures.Future())
+        return futures[-1]
+
+    monkeypatch.setattr(scraper_app, 'submit', fake_submit)
+    monkeypatch.setattr(scraper_app, '_test_jobs', {})
+    return futures
+
+
+def test_test_city_rejects_jobs_over_the_cap(client, pending_test_jobs):
+    for _ in range(scraper_app.MAX_TEST_JOBS):
+        assert client.get('/test_city/pune').status_code == 202
+
+    busy = client.get('/test_city/pune')
+    assert busy.status_code == 429
+    assert 'Retry-After' in busy.headers
+
+    pending_test_jobs[0].set_result([])
+    assert client.get('/test_city/pune').status_code == 202
+
+
+def test_test_city_expires_uncollected_results(client, pending_test_jobs, monkeypatch):
+    job_id = client.get('/test_city/pune').get_json()['job_id']
+    pending_test_jobs[0].set_result([{'name': 'Turf A'}])
+
+    monkeypatch.setattr(scraper_app, 'TEST_JOB_TTL', -1)
+    assert client.get(f'/test_city/pune?job={job_id}').status_code == 404
+
+
+class FakePool:
+    async def acquire(self):
+        return object()
+
+    async def release(self, context):
+        pass
+
+
+def test_cached_venues_take_the_current_city(tmp_path):
+    cache = scraper_app.VenueCache(path=str(tmp_path / 'cache.db'))
+    venue_url = 'https://www.khelomore.com/sports-venues/mumbai/turf-a'
+    cache.put(venue_url, {'name': 'Turf A', 'city': 'mumbai'})
+    cache.put_listing('navi-mumbai', [venue_url])
+
+    scraper = scraper_app.VenueScraper(cache=cache)
+    venues = asyncio.run(scraper.scrape_city_venues(FakePool(), 'navi-mumbai'))
+    assert [venue['city'] for venue in venues] == ['navi-mumbai']
+    assert cache.get_many([venue_url])[venue_url]['city'] == 'mumbai'
+
+
+@pytest.fixture
+def scraper(tmp_path):
+    scraper = scraper_app.VenueScraper(cache=scraper_app.VenueCache(path=str(tmp_path / 'cache.db')))
+    scraper._start_run(max_venue_loads=4)
+    return scraper
+
+
+def paused_for(scraper, url):
+    return scraper.bucket_for(url)._paused_until - time.monotonic()
+
+
+def test_retry_after_accepts_seconds_and_http_dates(scraper):
+    assert scraper.parse_retry_after('120') == 120
+    in_90s = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=90), usegmt=True)
+    assert scraper.parse_retry_after(in_90s) == pytest.approx(90, abs=2)
+    assert scraper.parse_retry_after('soon') is None
+
+
+def test_retry_after_pauses_the_host_on_429(scraper):
+    url = 'https://www.khelomore.com/api/venues'
+    scraper.honor_rate_limits(SimpleNamespace(status=429, url=url, headers={'retry-after': '30'}))
+    assert paused_for(scraper, url) == pytest.approx(30, abs=1)
+    assert paused_for(scraper, 'https://other.example/') <= 0
+
+
+@pytest.mark.parametrize('reset', ['30', str(time.time() + 30)], ids=['seconds', 'epoch'])
+def test_ratelimit_reset_is_seconds_or_epoch(scraper, reset):
+    url = 'https://www.khelomore.com/api/venues'
+    headers = {'x-ratelimit-remaining': '0', 'x-ratelimit-reset': reset}
+    scraper.honor_rate_limits(SimpleNamespace(status=200, url=url, headers=headers))
+    assert paused_for(scraper, url) == pytest.approx(30, abs=2)
+
+
+def test_ratelimit_with_budget_left_does_not_pause(scraper):
+    url = 'https://www.khelomore.com/api/venues'
+    headers = {'x-ratelimit-remaining': '5', 'x-ratelimit-reset': '30'}
+    scraper.honor_rate_limits(SimpleNamespace(status=200, url=url, headers=headers))
+    assert paused_for(scraper, url) <= 0
+
+
+def test_token_bucket_spaces_requests_and_honours_pauses():
+    async def run():
+        bucket = scraper_app.TokenBucket(rate=20, capacity=1)
+        started = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        spaced = time.monotonic() - started
+
+        bucket.pause(0.2)
+        started = time.monotonic()
+        await bucket.acquire()
+        return spaced, time.monotonic() - started
+
+    spaced, paused = asyncio.run(run())
+    assert spaced >= 0.09
+    assert paused >= 0.19
+
+
+def test_aimd_controller_grows_while_fast_and_halves_on_errors():
+    controller = scraper_app.AIMDController(initial=2, minimum=1, maximum=3, target_latency=1.0)
+    controller.on_success(0.5)
+    controller.on_success(0.5)
+    controller.on_success(0.5)
+    assert controller.limit == 3
+
+    controller.on_success(10.0)
+    assert controller.limit == 3
+    controller.on_error()
+    assert controller.limit == 1.5
+    controller.on_error()
+    assert controller.limit == 1
+
+
+def test_aimd_controller_caps_concurrent_loads():
+    async def run():
+        controller = scraper_app.AIMDController(initial=1)
+        order = []
+
+        async def load(name):
+            async with controller:
+                order.append(f'{name} start')
+                await asyncio.sleep(0.01)
+                order.append(f'{name} end')
+
+        await asyncio.gather(load('a'), load('b'))
+        return order
+
+    assert asyncio.run(run()) == ['a start', 'a end', 'b start', 'b end']
+
+
+class FakeContext:
+    def __init__(self):
+        self.pages = []
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+def test_context_pool_recycles_contexts_after_max_uses():
+    async def run():
+        created = []
+
+        async def create_context():
+            created.append(FakeContext())
+            return created[-1]
+
+        pool = scraper_app.ContextPool(create_context, size=1, max_uses=2)
+        for _ in range(3):
+            await pool.release(await pool.acquire())
+        return created
+
+    created = asyncio.run(run())
+    assert len(created) == 2
+    assert created[0].closed and not created[1].closed
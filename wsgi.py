@@ -1,13 +1,12 @@
-""
+"""
 WSGI config for KheloMore Scraper.
 
-This module contains the WSGI application used by Django's development server
-and any production WSGI deployments.
+This module exposes the WSGI application for production servers, e.g.:
+
+    gunicorn --workers 1 --threads 4 --worker-class gthread --timeout 120 wsgi:application
+
+Scrapes run on a background event loop inside the worker, so /status and
+/download_excel stay responsive on the gthread worker's other threads.
 """
 
-import os
 from app import app as application  # noqa
-
-if __name__ == "__main__":
-    port = int(os.environ.get("PORT", 8080))
-    application.run(host='0.0.0.0', port=port, debug=False)